@@ -1,14 +1,21 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Response, Header, Depends, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from google.adk.sessions import DatabaseSessionService
-from google.adk.runners import Runner
-from google.genai.types import Content, Part
-from agent import root_agent
-import os
-
-from dotenv import load_dotenv
-load_dotenv()
+from pydantic import BaseModel, field_validator
+from settings import get_settings
+from session_turns import SessionTurns
+from coalesce import coalesce_stats
+from tools import submit_application
+from status_feed import record_status_change, status_events_since, status_hub, RECHECK_SECONDS
+from eligibility import load_scheme_criteria, stream_eligible_users, read_aadhaar_numbers, stream_batch_eligibility
+import json
+import hmac
+import asyncio
+import tempfile
+import threading
+import time
+from collections import deque
 
 app = FastAPI(title="Schemes Agent")
 
@@ -20,49 +27,112 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-SESSIONS_DB_PATH=os.getenv("SESSIONS_DB_PATH")
-print("db_path:", SESSIONS_DB_PATH)
-session_service = DatabaseSessionService(db_url="sqlite:///" + SESSIONS_DB_PATH)
-
 APP_NAME = "gov-scheme-app"
 USER_ID = "User123"
 
+# google.adk, LiteLLM and the agent are only needed by /agent/run; they are imported
+# on first use (or by the startup warm-up) so the server starts accepting requests first
+_agent_runtime = None
+_agent_runtime_lock = threading.Lock()
+
+def get_agent_runtime() -> dict:
+    global _agent_runtime
+    with _agent_runtime_lock:
+        if _agent_runtime is None:
+            from google.adk.sessions import DatabaseSessionService
+            from google.adk.runners import Runner
+            from agent import root_agent
+
+            settings = get_settings()
+            agent, recorder = root_agent, None
+            if settings.record_sessions_dir:
+                from recorder import SessionRecorder
+                recorder = SessionRecorder(settings.record_sessions_dir)
+                agent = recorder.attach(root_agent)
+
+            print("db_path:", settings.sessions_db_path)
+            session_service = DatabaseSessionService(db_url="sqlite:///" + settings.sessions_db_path)
+            # assigned once complete, so agent_runtime() can read it without the lock
+            _agent_runtime = {
+                "session_service": session_service,
+                "runner": Runner(agent=agent, app_name=APP_NAME, session_service=session_service),
+                "recorder": recorder,
+            }
+    return _agent_runtime
+
+async def agent_runtime() -> dict:
+    # only the first requests (before the warm-up finishes) wait on the import in a thread
+    if _agent_runtime is not None:
+        return _agent_runtime
+    return await asyncio.get_running_loop().run_in_executor(None, get_agent_runtime)
+
+@app.on_event("startup")
+async def warm_up_agent_runtime():
+    # load the agent stack in the background; other endpoints are served meanwhile
+    if get_settings().warm_up_agent:
+        asyncio.get_running_loop().run_in_executor(None, get_agent_runtime)
+
 # request body model
 class AgentRequest(BaseModel):
     query: str
     session_id: str
+    idempotency_key: str = None
+    expected_version: int = None
 
-@app.post("/agent/run")
-async def run_agent(body: AgentRequest):
-    try:
-        # initialize runner
-        runner = Runner(
-            agent=root_agent,
-            app_name=APP_NAME,
-            session_service=session_service
-        )
+class ApplicationRequest(BaseModel):
+    scheme_name: str = ""
+    scheme_id: int = 0
+    aadhar_number: str
+    applicant_name: str
+    phone: str
+    collected_information: dict = {}
+    documents: list = []
+
+    @field_validator("scheme_id", mode="before")
+    @classmethod
+    def reject_bool_scheme_id(cls, value):
+        # pydantic would turn true into scheme 1
+        if isinstance(value, bool):
+            raise ValueError("scheme_id must be a number")
+        return value
 
-        # reuse session if provided, else create a new one
-        if body.session_id:
-            session = await session_service.get_session(app_name=APP_NAME, user_id=USER_ID ,session_id=body.session_id)
-            if session is None:
-                session = await session_service.create_session(
-                    app_name=APP_NAME,
-                    user_id=USER_ID,
-                    session_id=body.session_id
-                )
-                
-        print("session object:", session)
-
-        content = Content(role="user", parts=[Part(text=body.query)])
-
-        events = runner.run_async(
+class StatusUpdateRequest(BaseModel):
+    status: str
+    officer_level: str = None
+    remarks: str = None
+
+async def run_turn(session_id: str, query: str) -> tuple:
+    from google.genai.types import Content, Part
+
+    runtime = await agent_runtime()
+    runner, session_service = runtime["runner"], runtime["session_service"]
+
+    # reuse session if provided, else create a new one
+    session = await session_service.get_session(app_name=APP_NAME, user_id=USER_ID ,session_id=session_id)
+    if session is None:
+        session = await session_service.create_session(
+            app_name=APP_NAME,
             user_id=USER_ID,
-            session_id=session.id,
-            new_message=content
+            session_id=session_id
         )
 
-        full_response_text = "No final response was received from the agent."
+    print("session object:", session)
+    # this turn adds one user event to the session already loaded here
+    version = _user_turns(session) + 1
+
+    content = Content(role="user", parts=[Part(text=query)])
+
+    recorder = runtime["recorder"]
+    recording = recorder.start_turn(session.id, query) if recorder else None
+
+    events = runner.run_async(
+        user_id=USER_ID,
+        session_id=session.id,
+        new_message=content
+    )
+
+    full_response_text = "No final response was received from the agent."
+    try:
         async for event in events:
             print(f"Event received from: {event.author}")
             if event.is_final_response():
@@ -73,8 +143,191 @@ async def run_agent(body: AgentRequest):
                 else:
                     full_response_text = "Final response event had no content."
                 break
+    finally:
+        if recorder:
+            recorder.finish_turn(session.id, recording, full_response_text)
+
+    return {"response": full_response_text, "session_id": session.id}, version
+
+def _user_turns(session) -> int:
+    # the session version is the number of user turns stored, so every worker (and a restarted one) agrees
+    return sum(1 for event in session.events if event.author == "user")
+
+async def stored_session_version(session_id: str) -> int:
+    # only needed to check a request's expected_version before its turn starts
+    runtime = await agent_runtime()
+    session = await runtime["session_service"].get_session(app_name=APP_NAME, user_id=USER_ID, session_id=session_id)
+    if session is None:
+        return 0
+    return _user_turns(session)
+
+session_turns = SessionTurns(load_version=stored_session_version)
 
-        return {"response": full_response_text, "session_id": session.id}
+@app.post("/agent/run")
+async def run_agent(body: AgentRequest, idempotency_key: str = Header(None)):
+    try:
+        # one turn per session at a time; a retried request with the same key gets the same answer
+        result, version = await session_turns.run(
+            body.session_id,
+            idempotency_key or body.idempotency_key,
+            lambda: run_turn(body.session_id, body.query),
+            expected_version=body.expected_version
+        )
+        return {**result, "version": version}
 
     except Exception as e:
-        return {"error": str(e)}
\ No newline at end of file
+        return {"error": str(e)}
+
+
+@app.get("/schemes/{scheme_id}/eligible-users")
+def eligible_users(scheme_id: int, workers: int = None):
+    if load_scheme_criteria(scheme_id) is None:
+        return {"error": f"No scheme found with id {scheme_id}"}
+    return StreamingResponse(
+        stream_eligible_users(scheme_id, workers=workers),
+        media_type="application/x-ndjson"
+    )
+
+
+def _spooled_lines(upload):
+    upload.seek(0)
+    for line in upload:
+        yield line.decode("utf-8")
+
+def _batch_results(upload, workers):
+    with upload:
+        yield from stream_batch_eligibility(read_aadhaar_numbers(_spooled_lines(upload)), workers=workers)
+
+@app.post("/eligibility/batch")
+async def eligibility_batch(request: Request, workers: int = None):
+    # accepts a CSV or NDJSON body of Aadhaar numbers; results stream back as NDJSON.
+    # The upload is spooled (to disk past 1 MiB) and checked before the response starts,
+    # so a malformed line is a 400 rather than a stream cut short.
+    upload = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    async for chunk in request.stream():
+        upload.write(chunk)
+    try:
+        await run_in_threadpool(lambda: deque(read_aadhaar_numbers(_spooled_lines(upload)), maxlen=0))
+    except ValueError as e:
+        upload.close()
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(_batch_results(upload, workers), media_type="application/x-ndjson")
+
+
+@app.post("/applications")
+async def create_application(body: ApplicationRequest):
+    # same validation and single-transaction write the agent's submit_application tool uses
+    return await submit_application(
+        body.scheme_name, body.aadhar_number, body.applicant_name, body.phone,
+        json.dumps(body.collected_information), json.dumps(body.documents), body.scheme_id
+    )
+
+
+def require_backoffice(x_backoffice_token: str = Header(None)):
+    # status changes are only accepted from back-offices holding the shared BACKOFFICE_TOKEN
+    expected = get_settings().backoffice_token
+    if not expected:
+        raise HTTPException(status_code=503, detail="BACKOFFICE_TOKEN is not configured")
+    if not x_backoffice_token or not hmac.compare_digest(x_backoffice_token.encode(), expected.encode()):
+        raise HTTPException(status_code=401, detail="Invalid back-office token")
+
+@app.post("/applications/{application_uuid}/status", dependencies=[Depends(require_backoffice)])
+async def update_application_status(application_uuid: str, body: StatusUpdateRequest):
+    # called by department back-offices when an L1/L2/... officer acts on an application;
+    # the DB write runs in the threadpool, publishing stays on the loop that owns the queues
+    event = await run_in_threadpool(
+        record_status_change, application_uuid, body.status, body.officer_level, body.remarks
+    )
+    if "error" not in event:
+        status_hub.publish(event)
+    return event
+
+
+@app.get("/applications/{application_uuid}/status/poll")
+async def poll_application_status(application_uuid: str, after: int = None, timeout: float = 30):
+    # subscribe before the catch-up read so an update landing in between is not missed
+    queue = status_hub.subscribe(application_uuid)
+    try:
+        result = await run_in_threadpool(status_events_since, application_uuid, after)
+        if "error" in result or result["events"]:
+            return result
+        # updates made by other workers are not published here, so the log is re-read while idle
+        deadline = time.monotonic() + min(timeout, 60)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return {"events": []}
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=min(remaining, RECHECK_SECONDS))
+                return {"events": [event]}
+            except asyncio.TimeoutError:
+                result = await run_in_threadpool(status_events_since, application_uuid, after)
+                if "error" in result or result["events"]:
+                    return result
+    finally:
+        status_hub.unsubscribe(application_uuid, queue)
+
+
+@app.websocket("/applications/{application_uuid}/status/ws")
+async def watch_application_status(websocket: WebSocket, application_uuid: str, after: int = None):
+    await websocket.accept()
+    queue = status_hub.subscribe(application_uuid)
+    receiver = getter = None
+    try:
+        result = await run_in_threadpool(status_events_since, application_uuid, after)
+        if "error" in result:
+            await websocket.send_json(result)
+            await websocket.close()
+            return
+        last_sent = after or 0
+        for event in result["events"]:
+            await websocket.send_json(event)
+            last_sent = max(last_sent, event["event_id"])
+
+        # clients send nothing, but reading is what notices a disconnect between status events
+        receiver = asyncio.ensure_future(websocket.receive())
+        getter = asyncio.ensure_future(queue.get())
+        while True:
+            done, _ = await asyncio.wait(
+                {receiver, getter}, timeout=RECHECK_SECONDS, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                # idle: pick up updates that other workers wrote to the event log
+                result = await run_in_threadpool(status_events_since, application_uuid, last_sent)
+                for event in result.get("events", ()):
+                    await websocket.send_json(event)
+                    last_sent = max(last_sent, event["event_id"])
+                continue
+            if receiver in done:
+                if receiver.result()["type"] == "websocket.disconnect":
+                    break
+                receiver = asyncio.ensure_future(websocket.receive())
+            if getter in done:
+                event = getter.result()
+                # an event published during the catch-up read is queued and read as well
+                if event["event_id"] > last_sent:
+                    await websocket.send_json(event)
+                    last_sent = event["event_id"]
+                getter = asyncio.ensure_future(queue.get())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in (receiver, getter):
+            if task is not None:
+                task.cancel()
+        status_hub.unsubscribe(application_uuid, queue)
+
+
+@app.get("/health")
+def health(response: Response):
+    # readiness: 503 while the agent stack is still loading, unless this worker skips it
+    agent_loaded = _agent_runtime is not None
+    if get_settings().warm_up_agent and not agent_loaded:
+        response.status_code = 503
+        return {"status": "starting", "agent_loaded": False}
+    return {"status": "ok", "agent_loaded": agent_loaded}
+
+
+@app.get("/metrics/coalesce")
+def tool_coalescing_metrics():
+    return coalesce_stats()
@@ -0,0 +1,112 @@
+"""
+Startup profile for the API process.
+
+1. Import-time breakdown: runs `python -X importtime -c "import <module>"` and lists the
+   top-level imports by cumulative time.
+2. Time to first request: starts uvicorn, polls GET /health until it answers (503 while
+   the agent stack is still loading), then until it reports ready, and gives the
+   server's RSS at both points.
+
+Usage: python bench_startup.py [--module api] [--top 15] [--port 8765] [--skip-server]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def import_profile(module: str, top: int):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=HERE, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        print(result.stderr.splitlines()[-1])
+        return
+
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # nesting is shown by two spaces per level after the leading one
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth <= 1:
+            entries.append((int(cumulative_us), int(self_us), depth, name.strip()))
+
+    total = sum(cumulative for cumulative, _, depth, _ in entries if depth == 0)
+    print(f"import {module}: {total / 1000:.0f} ms total (top-level imports and their direct imports)")
+    print(f"{'module':<45}{'cumulative ms':>15}{'self ms':>10}")
+    for cumulative, self_us, depth, name in sorted(entries, reverse=True)[:top]:
+        print(f"{'  ' * depth + name:<45}{cumulative / 1000:>15.1f}{self_us / 1000:>10.1f}")
+
+
+def rss_kb(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def health(port: int):
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        # answered, but not ready yet
+        return json.loads(e.read())
+    except OSError:
+        return None
+
+
+def time_to_first_request(module: str, port: int, timeout: float = 120):
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{module}:app", "--port", str(port), "--log-level", "warning"],
+        cwd=HERE, stdout=subprocess.DEVNULL
+    )
+    try:
+        status = None
+        while status is None and time.perf_counter() - start < timeout:
+            if server.poll() is not None:
+                print("server exited before answering")
+                return
+            status = health(port)
+            if status is None:
+                time.sleep(0.02)
+        print(f"first request answered after {(time.perf_counter() - start) * 1000:.0f} ms, "
+              f"RSS {rss_kb(server.pid) / 1024:.1f} MiB")
+
+        # a server without the field (no /health) has loaded everything before answering
+        while status and not status.get("agent_loaded", True) and time.perf_counter() - start < timeout:
+            time.sleep(0.05)
+            status = health(port)
+        if status and status.get("agent_loaded", True):
+            print(f"agent stack loaded after {(time.perf_counter() - start) * 1000:.0f} ms, "
+                  f"RSS {rss_kb(server.pid) / 1024:.1f} MiB")
+        else:
+            print("agent stack not loaded (AGENT_WARM_UP disabled?)")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="api")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--skip-server", action="store_true")
+    args = parser.parse_args()
+
+    import_profile(args.module, args.top)
+    if not args.skip_server:
+        print()
+        time_to_first_request(args.module, args.port)
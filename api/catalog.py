@@ -0,0 +1,141 @@
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+
+from settings import get_settings
+
+# --- Catalog snapshot layout (written by db_modifier.py, keep both in sync) ---
+SNAPSHOT_MAGIC = b"KSCATLG1"
+SNAPSHOT_HEADER = struct.Struct("<8sIIIQQ")  # magic, catalog version, count, record size, blob offset, blob size
+SNAPSHOT_STRING_FIELDS = (
+    "name", "department_name", "definition", "eligibility_summary", "gender_eligibility", "benefit_type",
+    "community_eligibility", "districts", "procedure_steps", "supporting_documents", "required_information",
+)
+SNAPSHOT_RECORD = struct.Struct("<iiiidddd" + "II" * len(SNAPSHOT_STRING_FIELDS))
+
+NUMERIC_FIELDS = (
+    "id", "department_id", "min_age", "max_age",
+    "max_annual_income", "max_benefit_amount", "interest_rate", "application_fee",
+)
+JSON_FIELDS = {"community_eligibility", "districts", "procedure_steps", "supporting_documents", "required_information"}
+
+_NUMERIC_INDEX = {field: i for i, field in enumerate(NUMERIC_FIELDS)}
+_STRING_INDEX = {field: len(NUMERIC_FIELDS) + 2 * i for i, field in enumerate(SNAPSHOT_STRING_FIELDS)}
+
+# how often a worker looks at the CURRENT pointer for a newer snapshot version
+RELOAD_INTERVAL_SECONDS = 5.0
+
+
+class SchemeRecord:
+    """
+    One scheme in a mapped snapshot. Fields are read with `record["name"]` and decoded
+    (and JSON-parsed) only on first access; `raw()` gives the undecoded bytes without copying.
+    """
+
+    __slots__ = ("_snapshot", "_values", "_decoded")
+
+    def __init__(self, snapshot, values):
+        self._snapshot = snapshot
+        self._values = values
+        self._decoded = {}
+
+    def raw(self, field: str) -> memoryview:
+        i = _STRING_INDEX[field]
+        return self._snapshot.blob(self._values[i], self._values[i + 1])
+
+    def __getitem__(self, field: str):
+        if field in self._decoded:
+            return self._decoded[field]
+
+        if field in _NUMERIC_INDEX:
+            value = self._values[_NUMERIC_INDEX[field]]
+            if (isinstance(value, float) and math.isnan(value)) or (isinstance(value, int) and value == -1):
+                value = None
+        else:
+            value = str(self.raw(field), "utf-8")
+            if field in JSON_FIELDS:
+                value = json.loads(value or '[]')
+            elif not value:
+                value = None
+
+        self._decoded[field] = value
+        return value
+
+
+class CatalogSnapshot:
+    """
+    A read-only scheme catalog mapped from a snapshot file.
+
+    The file is shared through the page cache by every worker that maps it; records are
+    unpacked straight out of the mapping on first access and kept with the snapshot, so
+    each field is decoded once per worker and catalog version, not once per search.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+
+        magic, self.version, self.count, record_size, self._blob_offset, self._blob_size = \
+            SNAPSHOT_HEADER.unpack_from(self._mmap, 0)
+        if magic != SNAPSHOT_MAGIC or record_size != SNAPSHOT_RECORD.size:
+            raise ValueError(f"Unsupported catalog snapshot format: {path}")
+        self.path = path
+        self.file_name = os.path.basename(path)
+        self._records = [None] * self.count
+
+    def __len__(self):
+        return self.count
+
+    def record(self, index: int) -> SchemeRecord:
+        record = self._records[index]
+        if record is None:
+            values = SNAPSHOT_RECORD.unpack_from(self._mmap, SNAPSHOT_HEADER.size + index * SNAPSHOT_RECORD.size)
+            record = self._records[index] = SchemeRecord(self, values)
+        return record
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self.record(i)
+
+    def blob(self, offset: int, length: int) -> memoryview:
+        start = self._blob_offset + offset
+        return self._view[start:start + length]
+
+
+_current = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def current_catalog():
+    """
+    The snapshot this worker should read from, or None if no snapshot is configured.
+
+    CATALOG_SNAPSHOT_DIR/CURRENT is re-checked at most every RELOAD_INTERVAL_SECONDS; when
+    it names a new version the worker maps that file and drops the old one once no caller
+    holds its records any more, so a new catalog goes live without restarting.
+    """
+    global _current, _checked_at
+
+    snapshot_dir = get_settings().catalog_snapshot_dir
+    if not snapshot_dir:
+        return None
+    if _current is not None and time.monotonic() - _checked_at < RELOAD_INTERVAL_SECONDS:
+        return _current
+
+    with _lock:
+        _checked_at = time.monotonic()
+        try:
+            with open(os.path.join(snapshot_dir, "CURRENT")) as f:
+                file_name = f.read().strip()
+        except FileNotFoundError:
+            return _current
+        if _current is None or _current.file_name != file_name:
+            _current = CatalogSnapshot(os.path.join(snapshot_dir, file_name))
+            print(f"Loaded catalog snapshot version {_current.version}")
+    return _current
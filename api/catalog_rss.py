@@ -0,0 +1,113 @@
+"""
+Per-worker memory of find_eligible_schemes with the SQLite catalog vs the mapped snapshot.
+
+Starts N worker processes for each mode. Every worker runs a mix of personalized, named
+and general searches, then reports its RSS and PSS (proportional set size, which splits
+shared page-cache pages between the processes mapping them) from /proc/self/smaps_rollup.
+
+Usage: python catalog_rss.py [--workers 16] [--rounds 200] [--scale 1]
+    --scale N replicates every scheme N times to see how both modes grow with the catalog.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+QUERIES = [
+    ('{"age": 30, "gender": "Male", "district": "Bengaluru"}', ""),
+    ('{"age": 24, "gender": "Female", "community": "Backward Classes (BC/OBC)"}', ""),
+    ("{}", "Arivu"),
+    ("{}", ""),
+]
+
+
+def memory_kb() -> dict:
+    usage = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:"):
+                usage[parts[0][:-1].lower()] = int(parts[1])
+    return usage
+
+
+def worker(mode, env, rounds, barrier, results):
+    os.environ.update(env)
+    if mode == "sqlite":
+        os.environ.pop("CATALOG_SNAPSHOT_DIR", None)
+    import tools
+
+    async def run_queries():
+        for _ in range(rounds):
+            for user_profile_json, scheme_name in QUERIES:
+                await tools.find_eligible_schemes(user_profile_json, scheme_name)
+
+    asyncio.run(run_queries())
+    # measure while every worker is alive so shared pages are split between all of them
+    barrier.wait()
+    results.put(memory_kb())
+    barrier.wait()
+
+
+def build_scaled_db(source, target, scale):
+    shutil.copy(source, target)
+    conn = sqlite3.connect(target)
+    step = conn.execute("SELECT MAX(id) FROM schemes").fetchone()[0] + 1
+    columns = [r[1] for r in conn.execute("PRAGMA table_info(schemes)") if r[1] != "id"]
+    for i in range(1, scale):
+        conn.execute(f"""
+            INSERT INTO schemes (id, {', '.join(columns)})
+            SELECT id + {i * step}, {', '.join(columns)} FROM schemes WHERE id < {step}
+        """)
+        conn.execute(f"""
+            INSERT INTO scheme_geographies (scheme_id, state, district)
+            SELECT scheme_id + {i * step}, state, district FROM scheme_geographies WHERE scheme_id < {step}
+        """)
+    conn.commit()
+    conn.close()
+
+
+def run(mode, env, workers, rounds):
+    barrier = multiprocessing.Barrier(workers)
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=worker, args=(mode, env, rounds, barrier, results))
+                 for _ in range(workers)]
+    for p in processes:
+        p.start()
+    usage = [results.get() for _ in processes]
+    for p in processes:
+        p.join()
+    return {key: sum(u[key] for u in usage) / len(usage) for key in ("rss", "pss")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--scale", type=int, default=1)
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+    from db_modifier import create_catalog_snapshot
+
+    workdir = tempfile.mkdtemp()
+    db_path = os.path.join(workdir, "karnataka_schemes.db")
+    build_scaled_db(os.getenv("SCHEMES_DB_PATH", "karnataka_schemes.db"), db_path, args.scale)
+    snapshot_dir = os.path.join(workdir, "snapshots")
+    create_catalog_snapshot(db_path, snapshot_dir)
+    env = {"SCHEMES_DB_PATH": db_path, "CATALOG_SNAPSHOT_DIR": snapshot_dir}
+
+    print(f"{args.workers} workers, {args.rounds} rounds, catalog scale x{args.scale}")
+    print(f"{'mode':<10}{'RSS/worker (KiB)':>18}{'PSS/worker (KiB)':>18}")
+    for mode in ("sqlite", "snapshot"):
+        usage = run(mode, env, args.workers, args.rounds)
+        print(f"{mode:<10}{usage['rss']:>18.0f}{usage['pss']:>18.0f}")
+    shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import asyncio
+import functools
+import inspect
+import threading
+
+# per-tool counters: calls made, computations actually run, calls that shared one
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _count(name: str, field: str):
+    with _stats_lock:
+        stats = _stats.setdefault(name, {"calls": 0, "executions": 0, "collapsed": 0})
+        stats[field] += 1
+
+
+def coalesce_stats() -> dict:
+    """
+    Snapshot of the coalescing counters.
+
+    Returns:
+        dict: {tool_name: {"calls": int, "executions": int, "collapsed": int}}
+    """
+    with _stats_lock:
+        return {name: dict(stats) for name, stats in _stats.items()}
+
+
+def _share(result):
+    # callers get their own top-level copy of dict/list results so one cannot mutate another's
+    if isinstance(result, (dict, list)):
+        return result.copy()
+    return result
+
+
+def single_flight(normalize=None):
+    """
+    Collapse concurrent calls with identical (normalized) arguments into one computation.
+
+    Only calls that overlap in time share work; nothing is cached once the leading call
+    returns. Works for plain functions called from any thread and for coroutine functions
+    on an event loop. The wrapped function keeps its name, docstring and signature, so
+    it can still be registered as an agent tool.
+
+    Args:
+        normalize: Optional function taking the same arguments and returning a hashable
+                   key. Defaults to the bound arguments with defaults applied.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        name = func.__name__
+
+        def key_of(args, kwargs):
+            if normalize is not None:
+                return normalize(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return tuple(bound.arguments.items())
+
+        if inspect.iscoroutinefunction(func):
+            # one table per event loop; futures cannot be awaited across loops
+            inflight_by_loop = {}
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                _count(name, "calls")
+                loop = asyncio.get_running_loop()
+                inflight = inflight_by_loop.setdefault(loop, {})
+                key = key_of(args, kwargs)
+
+                task = inflight.get(key)
+                if task is not None:
+                    _count(name, "collapsed")
+                else:
+                    _count(name, "executions")
+                    # the computation is its own task, so it belongs to no single caller
+                    task = inflight[key] = loop.create_task(func(*args, **kwargs))
+
+                    def forget(task):
+                        del inflight[key]
+                        if not inflight:
+                            inflight_by_loop.pop(loop, None)
+                        # mark retrieved so a failure nobody waited for is not logged
+                        if not task.cancelled():
+                            task.exception()
+
+                    task.add_done_callback(forget)
+
+                # a cancelled caller only stops waiting; the others still get the result
+                return _share(await asyncio.shield(task))
+
+            return async_wrapper
+
+        inflight = {}
+        lock = threading.Lock()
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            _count(name, "calls")
+            key = key_of(args, kwargs)
+
+            with lock:
+                flight = inflight.get(key)
+                leader = flight is None
+                if leader:
+                    flight = inflight[key] = _Flight()
+
+            if not leader:
+                _count(name, "collapsed")
+                flight.done.wait()
+                if flight.error is not None:
+                    raise flight.error
+                return _share(flight.result)
+
+            _count(name, "executions")
+            try:
+                flight.result = func(*args, **kwargs)
+                return _share(flight.result)
+            except Exception as e:
+                flight.error = e
+                raise
+            finally:
+                with lock:
+                    del inflight[key]
+                flight.done.set()
+
+        return wrapper
+
+    return decorator
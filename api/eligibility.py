@@ -0,0 +1,428 @@
+import sqlite3
+import json
+import os
+import csv
+import re
+import threading
+import multiprocessing
+from datetime import date
+from concurrent.futures import ProcessPoolExecutor
+
+from settings import get_settings
+from tools import calculate_age, is_eligible
+
+# rows of user_details handed to one worker at a time; bounds per-worker memory
+CHUNK_SIZE = 50_000
+
+# most SQLite builds cap bound parameters at 999, so IN lookups are split below that
+LOOKUP_BATCH_SIZE = 500
+
+AADHAAR_PATTERN = re.compile(r"\d{12}")
+
+# the worker's read-only connection to the users DB, opened once per process
+_users_conn = None
+# the worker's scheme catalog for in-process scoring, and the schemes DB mtime it was loaded at
+_catalog = None
+_catalog_mtime = None
+
+# one process pool per API process, shared by every request; see get_pool()
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _load_criteria(conn, where: str = "", params: tuple = ()) -> list:
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT id, name, min_age, max_age, gender_eligibility, max_annual_income, community_eligibility
+        FROM schemes
+        {where}
+        ORDER BY id
+        """, params
+    )
+    schemes = [{
+        "id": row[0],
+        "name": row[1],
+        "min_age": row[2],
+        "max_age": row[3],
+        "gender_eligibility": row[4],
+        "max_annual_income": row[5],
+        "community_eligibility": json.loads(row[6] or '[]'),
+        "districts": [],
+    } for row in cursor.fetchall()]
+
+    by_id = {scheme["id"]: scheme for scheme in schemes}
+    cursor.execute("SELECT scheme_id, district FROM scheme_geographies")
+    for scheme_id, district in cursor.fetchall():
+        if scheme_id in by_id:
+            by_id[scheme_id]["districts"].append(district)
+    return schemes
+
+
+def load_scheme_criteria(scheme_id: int) -> dict:
+    """
+    Load the eligibility criteria of a single scheme.
+
+    Args:
+        scheme_id: Id of the scheme in the schemes DB.
+
+    Returns:
+        dict: {"id", "name", "min_age", "max_age", "gender_eligibility", "max_annual_income",
+               "community_eligibility", "districts"} or None if the scheme does not exist.
+    """
+    conn = sqlite3.connect(get_settings().schemes_db_path)
+    schemes = _load_criteria(conn, "WHERE id = ?", (scheme_id,))
+    conn.close()
+    return schemes[0] if schemes else None
+
+
+def load_scheme_catalog() -> list:
+    """
+    Load the eligibility criteria of every scheme, ordered by id.
+    """
+    conn = sqlite3.connect(get_settings().schemes_db_path)
+    schemes = _load_criteria(conn)
+    conn.close()
+    return schemes
+
+
+def _dob_cutoff(today: date, years: int) -> str:
+    # latest date of birth that makes someone `years` old today (Feb 29 falls back to Feb 28)
+    try:
+        return today.replace(year=today.year - years).isoformat()
+    except ValueError:
+        return today.replace(year=today.year - years, day=28).isoformat()
+
+
+def _user_columns(conn) -> list:
+    return [r[1] for r in conn.execute("PRAGMA table_info(user_details)")]
+
+
+def build_match_query(criteria: dict, columns: list, today: date = None):
+    """
+    Translate scheme criteria into one SQL statement over a user_id range of `user_details`.
+
+    The same rules as `find_eligible_schemes` are applied in reverse, so the whole
+    chunk is filtered inside SQLite and every matching row comes back already encoded
+    as a JSON line. Criteria on columns the users table does not have (annual_income,
+    community) are skipped, just like a profile without those keys; districts are
+    matched on `city` until the table has a `district` column.
+
+    Returns:
+        (query, params): the statement expects two more params, the user_id range bounds.
+    """
+    today = today or date.today()
+    conditions = []
+    params = []
+
+    # age is compared on the ISO dob string so the filter stays a plain range check
+    if criteria["min_age"] is not None:
+        conditions.append("dob <= ?")
+        params.append(_dob_cutoff(today, criteria["min_age"]))
+    if criteria["max_age"] is not None:
+        conditions.append("dob > ?")
+        params.append(_dob_cutoff(today, criteria["max_age"] + 1))
+
+    if criteria["gender_eligibility"] and criteria["gender_eligibility"] != "Any":
+        conditions.append("gender = ?")
+        params.append(criteria["gender_eligibility"])
+
+    if "annual_income" in columns and criteria["max_annual_income"] is not None:
+        conditions.append("annual_income <= ?")
+        params.append(criteria["max_annual_income"])
+
+    communities = criteria["community_eligibility"]
+    if "community" in columns and "General" not in communities:
+        conditions.append(f"community IN ({', '.join('?' * len(communities)) or 'NULL'})")
+        params.extend(communities)
+
+    # user_details only carries `city` today; it holds the district name
+    district_column = "district" if "district" in columns else "city"
+    if "All Districts" not in criteria["districts"]:
+        conditions.append(f"{district_column} IN ({', '.join('?' * len(criteria['districts'])) or 'NULL'})")
+        params.extend(criteria["districts"])
+
+    fields = ", ".join(f"'{c}', {c}" for c in columns)
+    age = "CAST(substr(?, 1, 4) AS INT) - CAST(substr(dob, 1, 4) AS INT) - (substr(?, 6, 5) < substr(dob, 6, 5))"
+    select_params = [today.isoformat(), today.isoformat()]
+
+    conditions.append("user_id BETWEEN ? AND ?")
+    query = f"""
+        SELECT json_object({fields}, 'age', {age})
+        FROM user_details
+        WHERE {' AND '.join(conditions)}
+        ORDER BY user_id
+    """
+    return query, select_params + params
+
+
+def _init_worker(db_path):
+    global _users_conn
+    _users_conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """
+    The process pool of this process, created on first use with one worker per CPU.
+
+    Workers are spawned rather than forked: the API process runs threads (uvicorn, the
+    agent warm-up) that may hold locks or be mid-import at fork time.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(get_settings().users_db_path,)
+            )
+    return _pool
+
+
+def _worker_count(workers: int = None) -> int:
+    # how many pool workers one request may keep busy; never more than the pool has
+    cpus = os.cpu_count() or 1
+    return max(1, min(workers or cpus, cpus))
+
+
+def _match_chunk(query, params, low, high) -> str:
+    rows = _users_conn.execute(query, (*params, low, high)).fetchall()
+    return "".join(row[0] + "\n" for row in rows)
+
+
+def stream_eligible_users(scheme_id: int, workers: int = None, chunk_size: int = CHUNK_SIZE):
+    """
+    Find every citizen in `user_details` who qualifies for a scheme.
+
+    The users table is split into user_id ranges that are matched in parallel by the
+    process pool. At most two chunks per worker are in flight, so memory stays bounded
+    no matter how large the table is, and chunks are yielded in user_id order.
+
+    Args:
+        scheme_id: Id of the scheme to match against.
+        workers: Number of pool workers to use (defaults to, and is capped at, the CPU count).
+        chunk_size: Number of user_ids handled by one worker task.
+
+    Yields:
+        str: One NDJSON line per eligible user (the user_details row plus `age`).
+    """
+    criteria = load_scheme_criteria(scheme_id)
+    if criteria is None:
+        raise ValueError(f"No scheme found with id {scheme_id}")
+
+    users_db_path = get_settings().users_db_path
+    conn = sqlite3.connect(f"file:{users_db_path}?mode=ro", uri=True)
+    columns = _user_columns(conn)
+    low, high = conn.execute("SELECT MIN(user_id), MAX(user_id) FROM user_details").fetchone()
+    conn.close()
+    if low is None:
+        return
+
+    query, params = build_match_query(criteria, columns)
+    workers = _worker_count(workers)
+    ranges = ((start, min(start + chunk_size - 1, high)) for start in range(low, high + 1, chunk_size))
+
+    pool = get_pool()
+    pending = []
+    try:
+        for start, end in ranges:
+            pending.append(pool.submit(_match_chunk, query, params, start, end))
+            if len(pending) >= workers * 2:
+                lines = pending.pop(0).result()
+                if lines:
+                    yield lines
+        while pending:
+            lines = pending.pop(0).result()
+            if lines:
+                yield lines
+    finally:
+        # a client that went away leaves queued chunks behind; don't run them
+        for future in pending:
+            future.cancel()
+
+
+def _profile_from_row(user: dict) -> dict:
+    # the same profile fetch_user_profile hands to find_eligible_schemes (district taken from city)
+    profile = {"age": calculate_age(user["dob"]), "gender": user["gender"]}
+    if "annual_income" in user:
+        profile["annual_income"] = user["annual_income"]
+    if "community" in user:
+        profile["community"] = user["community"]
+    profile["district"] = user["district"] if "district" in user else user.get("city")
+    return profile
+
+
+def _worker_catalog() -> list:
+    # reloaded when the schemes DB changes, since pool workers outlive requests
+    global _catalog, _catalog_mtime
+    mtime = os.stat(get_settings().schemes_db_path).st_mtime_ns
+    if _catalog is None or mtime != _catalog_mtime:
+        _catalog, _catalog_mtime = load_scheme_catalog(), mtime
+    return _catalog
+
+
+def fetch_profiles(conn, aadhaar_numbers: list) -> dict:
+    """
+    Look up many users with batched `IN` queries.
+
+    Returns:
+        dict: aadhaar_number -> user_details row as a dict, for the numbers that exist.
+    """
+    conn.row_factory = sqlite3.Row
+    users = {}
+    for i in range(0, len(aadhaar_numbers), LOOKUP_BATCH_SIZE):
+        batch = aadhaar_numbers[i:i + LOOKUP_BATCH_SIZE]
+        cursor = conn.execute(
+            f"SELECT * FROM user_details WHERE aadhaar_number IN ({', '.join('?' * len(batch))})", batch
+        )
+        for row in cursor:
+            users[row["aadhaar_number"]] = dict(row)
+    return users
+
+
+def _score_batch(aadhaar_numbers: list) -> str:
+    users = fetch_profiles(_users_conn, aadhaar_numbers)
+    catalog = _worker_catalog()
+    lines = []
+    for aadhaar_number in aadhaar_numbers:
+        user = users.get(aadhaar_number)
+        if user is None:
+            result = {"aadhaar_number": aadhaar_number, "error": "No user profile found for the provided Aadhaar number."}
+        else:
+            profile = _profile_from_row(user)
+            result = {
+                "aadhaar_number": aadhaar_number,
+                "full_name": user["full_name"],
+                "eligible_schemes": [
+                    {"id": scheme["id"], "name": scheme["name"]}
+                    for scheme in catalog if is_eligible(profile, scheme)
+                ],
+            }
+        lines.append(json.dumps(result) + "\n")
+    return "".join(lines)
+
+
+def _aadhaar_column(cells: list) -> int:
+    # index of the first cell holding a 12-digit number (spaces/hyphens allowed), or None
+    for i, cell in enumerate(cells):
+        if AADHAAR_PATTERN.fullmatch(re.sub(r"[\s-]", "", cell)):
+            return i
+    return None
+
+
+def read_aadhaar_numbers(lines):
+    """
+    Parse Aadhaar numbers from a CSV or NDJSON stream of text lines.
+
+    CSV input may have a header; the `aadhaar_number` (or `aadhaar`) column is used.
+    Without one, the column is the one holding a 12-digit number in the first data row,
+    and the first row counts as a header only if it has no such number. NDJSON lines may
+    be objects with an `aadhaar_number` key or bare JSON strings. The format is detected
+    from the first non-empty line.
+
+    Raises:
+        ValueError: for an NDJSON line that is not valid JSON or has no Aadhaar number.
+    """
+    lines = (line.strip() for line in lines)
+    lines = (line for line in lines if line)
+    first = next(lines, None)
+    if first is None:
+        return
+
+    if first[0] in '{"':
+        for number, line in enumerate(_chain(first, lines), start=1):
+            try:
+                record = json.loads(line)
+                yield str(record["aadhaar_number"] if isinstance(record, dict) else record)
+            except (ValueError, KeyError):
+                raise ValueError(f"Line {number} is not a JSON object with an aadhaar_number or a JSON string")
+        return
+
+    reader = csv.reader(_chain(first, lines))
+    cells = [cell.strip() for cell in next(reader)]
+    names = [cell.lower() for cell in cells]
+    column = next((names.index(name) for name in ("aadhaar_number", "aadhaar") if name in names), None)
+    if column is None:
+        column = _aadhaar_column(cells)
+        if column is None:
+            # a header with other column names; the next row tells where the numbers are
+            cells = [cell.strip() for cell in next(reader, [])]
+            column = _aadhaar_column(cells) or 0
+        if cells:
+            yield re.sub(r"[\s-]", "", cells[column]) if column < len(cells) else ""
+    for row in reader:
+        if row:
+            yield re.sub(r"[\s-]", "", row[column]) if column < len(row) else ""
+
+
+def _chain(first, rest):
+    yield first
+    yield from rest
+
+
+def stream_batch_eligibility(aadhaar_numbers, workers: int = None, batch_size: int = LOOKUP_BATCH_SIZE):
+    """
+    Score many citizens against the whole scheme catalog without going through the agent.
+
+    Aadhaar numbers are grouped into batches; each pool worker looks a batch up with
+    `IN` queries and evaluates eligibility in-process against a catalog it keeps loaded
+    between requests. Results are yielded in input order as soon as each batch completes.
+
+    Args:
+        aadhaar_numbers: Iterable of Aadhaar numbers (may be a lazy stream).
+        workers: Number of pool workers to use (defaults to, and is capped at, the CPU count).
+        batch_size: Number of Aadhaar numbers per worker task.
+
+    Yields:
+        str: NDJSON lines, one per Aadhaar number, with `eligible_schemes` or an `error`.
+    """
+    workers = _worker_count(workers)
+
+    pool = get_pool()
+    pending = []
+    try:
+        batch = []
+        for aadhaar_number in aadhaar_numbers:
+            batch.append(aadhaar_number)
+            if len(batch) < batch_size:
+                continue
+            pending.append(pool.submit(_score_batch, batch))
+            batch = []
+            if len(pending) >= workers * 2:
+                yield pending.pop(0).result()
+        if batch:
+            pending.append(pool.submit(_score_batch, batch))
+        while pending:
+            yield pending.pop(0).result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Batch eligibility matching over user_details, written as NDJSON.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    scheme_parser = commands.add_parser("scheme", help="stream every citizen eligible for a scheme")
+    scheme_parser.add_argument("scheme_id", type=int)
+    scheme_parser.add_argument("--workers", type=int, default=None)
+    scheme_parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    batch_parser = commands.add_parser("batch", help="score a CSV/NDJSON list of Aadhaar numbers (stdin if no file)")
+    batch_parser.add_argument("input", nargs="?", default="-")
+    batch_parser.add_argument("--workers", type=int, default=None)
+    batch_parser.add_argument("--batch-size", type=int, default=LOOKUP_BATCH_SIZE)
+    args = parser.parse_args()
+
+    if args.command == "scheme":
+        for lines in stream_eligible_users(args.scheme_id, workers=args.workers, chunk_size=args.chunk_size):
+            sys.stdout.write(lines)
+    else:
+        source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+        with source:
+            aadhaar_numbers = read_aadhaar_numbers(source)
+            for lines in stream_batch_eligibility(aadhaar_numbers, workers=args.workers, batch_size=args.batch_size):
+                sys.stdout.write(lines)
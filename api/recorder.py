@@ -0,0 +1,152 @@
+import contextvars
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+# the turn being recorded; set around runner.run_async so the agent callbacks can find it
+_current_turn = contextvars.ContextVar("recorded_turn", default=None)
+
+# sessions whose last request size is remembered; an evicted one records its next request in full
+MAX_TRACKED_SESSIONS = 10_000
+
+
+def estimate_prompt_tokens(llm_request) -> int:
+    """
+    Rough prompt size of a model request: system instruction, conversation and tool
+    declarations as sent, at ~4 UTF-8 bytes per token. Used to compare runs, not to bill.
+    """
+    payload = {
+        "config": _dump(llm_request.config) if llm_request.config is not None else None,
+        "contents": [_dump(content) for content in llm_request.contents],
+    }
+    return -(-len(json.dumps(payload, ensure_ascii=False).encode("utf-8")) // 4)
+
+
+def _dump(value):
+    # pydantic objects from google.genai / google.adk, or plain JSON values
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json", exclude_none=True)
+    return value
+
+
+def fixture_file_name(session_id: str) -> str:
+    # session ids come from clients: keep a readable part, and a hash so different ids never share a file
+    readable = re.sub(r"[^A-Za-z0-9_-]", "_", session_id)[:64]
+    digest = hashlib.sha256(session_id.encode("utf-8")).hexdigest()[:12]
+    return f"{readable}-{digest}.json"
+
+
+class SessionRecorder:
+    """
+    Captures /agent/run sessions as replayable fixtures.
+
+    Each turn stores the user message, every model request (its new contents and size)
+    and response, every tool call with its arguments and result, and timings. Sessions are written to
+    `<out_dir>/<fixture_file_name(session_id)>` after every turn, in the format `replay.py` reads.
+
+    The agent callbacks are the ADK before/after model and tool callbacks; attach them
+    with `attach(agent)`.
+    """
+
+    def __init__(self, out_dir: str):
+        self.out_dir = out_dir
+        os.makedirs(out_dir, exist_ok=True)
+        # how many contents each session's last model request had, to store only what is new
+        self._content_counts = OrderedDict()
+
+    def attach(self, agent):
+        return agent.model_copy(update={
+            "before_model_callback": self.before_model,
+            "after_model_callback": self.after_model,
+            "before_tool_callback": self.before_tool,
+            "after_tool_callback": self.after_tool,
+        })
+
+    def start_turn(self, session_id: str, query: str):
+        turn = {
+            "session_id": session_id,
+            "user": query,
+            "model_requests": [],
+            "model_responses": [],
+            "model_latency_ms": [],
+            "tool_calls": [],
+            "_started": time.perf_counter(),
+            "_pending": {},
+        }
+        return _current_turn.set(turn)
+
+    def finish_turn(self, session_id: str, token, final_response: str):
+        turn = _current_turn.get()
+        _current_turn.reset(token)
+        if turn is None:
+            return
+
+        turn["final_response"] = final_response
+        turn["latency_ms"] = round((time.perf_counter() - turn.pop("_started")) * 1000)
+        turn.pop("_pending")
+        turn.pop("session_id")
+
+        path = os.path.join(self.out_dir, fixture_file_name(session_id))
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                recording = json.load(f)
+        else:
+            recording = {
+                "name": session_id,
+                "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "turns": [],
+            }
+        recording["turns"].append(turn)
+
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(recording, f, ensure_ascii=False, indent=2)
+        os.replace(path + ".tmp", path)
+
+    # --- ADK callbacks; returning None lets the agent proceed unchanged ---
+
+    def before_model(self, callback_context, llm_request):
+        turn = _current_turn.get()
+        if turn is not None:
+            seen = self._content_counts.get(turn["session_id"], 0)
+            self._content_counts[turn["session_id"]] = len(llm_request.contents)
+            self._content_counts.move_to_end(turn["session_id"])
+            if len(self._content_counts) > MAX_TRACKED_SESSIONS:
+                self._content_counts.popitem(last=False)
+            turn["model_requests"].append({
+                "content_count": len(llm_request.contents),
+                "new_contents": [_dump(content) for content in llm_request.contents[seen:]],
+                "tools": sorted(getattr(llm_request, "tools_dict", {}) or {}),
+                "estimated_prompt_tokens": estimate_prompt_tokens(llm_request),
+            })
+            turn["_pending"]["model"] = time.perf_counter()
+        return None
+
+    def after_model(self, callback_context, llm_response):
+        turn = _current_turn.get()
+        if turn is not None and not llm_response.partial:
+            started = turn["_pending"].pop("model", None)
+            turn["model_responses"].append(_dump(llm_response))
+            turn["model_latency_ms"].append(round((time.perf_counter() - started) * 1000) if started else None)
+        return None
+
+    def before_tool(self, tool, args, tool_context):
+        turn = _current_turn.get()
+        if turn is not None:
+            turn["_pending"][tool_context.function_call_id] = time.perf_counter()
+        return None
+
+    def after_tool(self, tool, args, tool_context, tool_response):
+        turn = _current_turn.get()
+        if turn is not None:
+            started = turn["_pending"].pop(tool_context.function_call_id, None)
+            turn["tool_calls"].append({
+                "name": tool.name,
+                "args": _dump(args),
+                "response": _dump(tool_response),
+                "latency_ms": round((time.perf_counter() - started) * 1000) if started else None,
+            })
+        return None
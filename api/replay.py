@@ -0,0 +1,200 @@
+"""
+Offline replay of recorded conversations against the current agent code.
+
+Each fixture in replay_fixtures/ is a session captured by recorder.py: run the server with
+RECORD_SESSIONS_DIR set, play the conversation through /agent/run, then copy the recording
+(<RECORD_SESSIONS_DIR>/<session>-<hash>.json) to replay_fixtures/<scenario>.json and run
+--update-budgets. The model is replaced by a stub that returns the
+recorded responses in order, while the current instruction, tools and tool code run for
+real against throwaway copies of the databases.
+
+Per scenario it counts model calls, tool calls and estimated prompt tokens (from the
+requests the current code builds, so prompt, tool schema and tool output growth shows up)
+and compares them with replay_fixtures/budgets.json. The run exits with status 1 when a
+scenario is over budget or no longer follows its recording.
+
+Usage:
+    python replay.py                      # every fixture
+    python replay.py status_check         # selected scenarios
+    python replay.py --update-budgets     # write measured values (+ headroom) as budgets
+"""
+import argparse
+import asyncio
+import glob
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+from functools import lru_cache
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(HERE, "replay_fixtures")
+BUDGETS_FILE = os.path.join(FIXTURES_DIR, "budgets.json")
+DATABASES = {
+    "APPLICATION_DB_PATH": "applications.db",
+    "USERS_DB_PATH": "user_details.db",
+    "SCHEMES_DB_PATH": "karnataka_schemes.db",
+}
+BUDGET_METRICS = ("llm_calls", "tool_calls", "prompt_tokens")
+
+
+class ReplayDivergence(Exception):
+    """The agent no longer behaves the way the recording expects."""
+
+
+def isolate_databases(workdir: str):
+    # tools write (e.g. submit_application), so every run starts from fresh copies;
+    # must happen before settings are first read
+    for variable, name in DATABASES.items():
+        path = os.path.join(workdir, name)
+        shutil.copy(os.path.join(HERE, name), path)
+        os.environ[variable] = path
+    # empty rather than unset so load_dotenv does not fill them back in from .env
+    os.environ["CATALOG_SNAPSHOT_DIR"] = ""
+    os.environ["RECORD_SESSIONS_DIR"] = ""
+
+
+@lru_cache(maxsize=None)
+def replay_llm_class():
+    from google.adk.models.base_llm import BaseLlm
+    from google.adk.models.llm_response import LlmResponse
+    from recorder import estimate_prompt_tokens
+
+    class ReplayLlm(BaseLlm):
+        """Stub model that answers with the recorded responses of the current turn."""
+
+        model: str = "replay"
+        responses: list = []
+        calls: int = 0
+        prompt_tokens: int = 0
+
+        async def generate_content_async(self, llm_request, stream: bool = False):
+            self.calls += 1
+            self.prompt_tokens += estimate_prompt_tokens(llm_request)
+            if not self.responses:
+                raise ReplayDivergence(
+                    f"model call {self.calls} has no recorded response; the agent makes more model calls than recorded"
+                )
+            yield LlmResponse.model_validate(self.responses.pop(0))
+
+    return ReplayLlm
+
+
+async def replay_scenario(fixture: dict) -> dict:
+    from google.adk.runners import Runner
+    from google.adk.sessions import InMemorySessionService
+    from google.genai.types import Content, Part
+    from agent import root_agent
+
+    llm = replay_llm_class()()
+    tool_names = []
+
+    def count_tool(tool, args, tool_context):
+        tool_names.append(tool.name)
+        return None
+
+    agent = root_agent.model_copy(update={"model": llm, "before_tool_callback": count_tool})
+    session_service = InMemorySessionService()
+    runner = Runner(agent=agent, app_name="replay", session_service=session_service)
+    session = await session_service.create_session(app_name="replay", user_id="replay")
+
+    started = time.perf_counter()
+    for number, turn in enumerate(fixture["turns"], start=1):
+        llm.responses = list(turn["model_responses"])
+        tools_before = len(tool_names)
+
+        async for _ in runner.run_async(
+            user_id="replay",
+            session_id=session.id,
+            new_message=Content(role="user", parts=[Part(text=turn["user"])])
+        ):
+            pass
+
+        if llm.responses:
+            raise ReplayDivergence(f"turn {number}: {len(llm.responses)} recorded model responses were not used")
+        expected = [call["name"] for call in turn.get("tool_calls", [])]
+        if tool_names[tools_before:] != expected:
+            raise ReplayDivergence(f"turn {number}: tools called {tool_names[tools_before:]}, recorded {expected}")
+
+    return {
+        "llm_calls": llm.calls,
+        "tool_calls": len(tool_names),
+        "prompt_tokens": llm.prompt_tokens,
+        "replay_ms": round((time.perf_counter() - started) * 1000),
+        "recorded_ms": sum(turn.get("latency_ms") or 0 for turn in fixture["turns"]),
+    }
+
+
+def load_fixtures(names: list) -> dict:
+    fixtures = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.json"))):
+        if path == BUDGETS_FILE:
+            continue
+        with open(path, encoding="utf-8") as f:
+            fixture = json.load(f)
+        name = os.path.splitext(os.path.basename(path))[0]
+        if not names or name in names:
+            fixtures[name] = fixture
+    missing = set(names) - set(fixtures)
+    if missing:
+        sys.exit(f"No fixture named: {', '.join(sorted(missing))}")
+    return fixtures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenarios", nargs="*")
+    parser.add_argument("--update-budgets", action="store_true")
+    parser.add_argument("--headroom", type=float, default=1.1, help="prompt token headroom for --update-budgets")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    isolate_databases(workdir)
+    fixtures = load_fixtures(args.scenarios)
+    with open(BUDGETS_FILE, encoding="utf-8") as f:
+        budgets = json.load(f)
+
+    failed = False
+    print(f"{'scenario':<22}{'llm calls':>12}{'tool calls':>12}{'prompt tokens':>16}{'replay ms':>11}{'recorded ms':>13}")
+    try:
+        for name, fixture in fixtures.items():
+            try:
+                result = asyncio.run(replay_scenario(fixture))
+            except ReplayDivergence as e:
+                print(f"{name:<22}DIVERGED: {e}")
+                failed = True
+                continue
+
+            budget = budgets.get(name)
+            if args.update_budgets:
+                budgets[name] = budget = {
+                    "llm_calls": result["llm_calls"],
+                    "tool_calls": result["tool_calls"],
+                    "prompt_tokens": int(math.ceil(result["prompt_tokens"] * args.headroom / 100) * 100),
+                }
+
+            cells = []
+            for metric in BUDGET_METRICS:
+                limit = budget.get(metric) if budget else None
+                over = limit is not None and result[metric] > limit
+                failed |= over or limit is None
+                cells.append(f"{result[metric]}/{limit if limit is not None else '-'}{' !' if over else ''}")
+            print(f"{name:<22}{cells[0]:>12}{cells[1]:>12}{cells[2]:>16}{result['replay_ms']:>11}{result['recorded_ms']:>13}")
+            if budget is None:
+                print(f"{'':<22}no budget in {os.path.basename(BUDGETS_FILE)}; run with --update-budgets")
+    finally:
+        shutil.rmtree(workdir)
+
+    if args.update_budgets:
+        with open(BUDGETS_FILE, "w", encoding="utf-8") as f:
+            json.dump(budgets, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Updated {BUDGETS_FILE}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import asyncio
+from collections import OrderedDict
+
+# idle sessions whose last idempotent result is remembered
+MAX_TRACKED_SESSIONS = 10_000
+
+
+class StaleSessionError(Exception):
+    """Raised when a turn was requested against an older version of the session."""
+
+
+class SessionTurns:
+    """
+    Serializes agent turns per session while keeping different sessions fully parallel.
+
+    - Only one turn runs per session at a time; later turns queue on a per-session lock.
+    - A request carrying the same idempotency key as the in-flight (or just finished)
+      turn of that session attaches to its result instead of starting a new run.
+    - The session version comes from storage, so it survives restarts and is the same in
+      every worker: a turn reports the version it produced, and a caller that passes
+      `expected_version` has the current one read with `load_version(session_id)` (an async
+      function) and is rejected with StaleSessionError if another turn got in first.
+
+    The lock and the idempotency results only live in this process. With several workers,
+    two turns of one session can still run at once in different workers; the version check
+    then catches a turn that was already stored, not one still running elsewhere.
+    """
+
+    def __init__(self, load_version):
+        self._load_version = load_version
+        self._locks = {}
+        self._waiting = {}
+        self._inflight = {}
+        self._completed = OrderedDict()
+        self.runs = 0
+        self.attached = 0
+
+    def _duplicate_of(self, session_id: str, idempotency_key: str):
+        if not idempotency_key:
+            return None
+        inflight = self._inflight.get(session_id)
+        if inflight and inflight[0] == idempotency_key:
+            return inflight[1]
+        completed = self._completed.get(session_id)
+        if completed and completed[0] == idempotency_key:
+            return completed[1]
+        return None
+
+    async def run(self, session_id: str, idempotency_key: str, turn, expected_version: int = None):
+        """
+        Run `turn()` (a coroutine function returning `(result, version)`) as the next turn of a session.
+
+        Returns:
+            (result, version): the turn's result and the session version it produced.
+        """
+        duplicate = self._duplicate_of(session_id, idempotency_key)
+        if duplicate is not None:
+            self.attached += 1
+            return await asyncio.shield(duplicate)
+
+        lock = self._locks.setdefault(session_id, asyncio.Lock())
+        self._waiting[session_id] = self._waiting.get(session_id, 0) + 1
+        try:
+            async with lock:
+                # the same key may have been started by a request that queued ahead of us
+                duplicate = self._duplicate_of(session_id, idempotency_key)
+                if duplicate is not None:
+                    self.attached += 1
+                    return await asyncio.shield(duplicate)
+
+                if expected_version is not None:
+                    version = await self._load_version(session_id)
+                    if expected_version != version:
+                        raise StaleSessionError(f"Session {session_id} is at version {version}, not {expected_version}")
+
+                task = asyncio.ensure_future(turn())
+                task.add_done_callback(lambda t: self._finish(session_id, idempotency_key, t))
+                self._inflight[session_id] = (idempotency_key, task)
+                self.runs += 1
+                try:
+                    # shield so a client disconnect does not cancel the turn for attached duplicates
+                    return await asyncio.shield(task)
+                finally:
+                    # hold the session lock until the turn has really finished appending events
+                    if not task.done():
+                        await asyncio.wait([task])
+        finally:
+            self._waiting[session_id] -= 1
+            if not self._waiting[session_id]:
+                del self._waiting[session_id]
+                del self._locks[session_id]
+
+    def _finish(self, session_id: str, idempotency_key: str, task):
+        if self._inflight.get(session_id, (None, None))[1] is task:
+            del self._inflight[session_id]
+        if idempotency_key and not task.cancelled() and task.exception() is None:
+            _remember(self._completed, session_id, (idempotency_key, task))
+
+
+def _remember(recent: OrderedDict, session_id: str, value):
+    recent[session_id] = value
+    recent.move_to_end(session_id)
+    if len(recent) > MAX_TRACKED_SESSIONS:
+        recent.popitem(last=False)
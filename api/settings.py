@@ -0,0 +1,38 @@
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+
+from dotenv import load_dotenv
+
+
+@dataclass(frozen=True)
+class Settings:
+    application_db_path: str
+    sessions_db_path: str
+    schemes_db_path: str
+    users_db_path: str
+    catalog_snapshot_dir: str
+    warm_up_agent: bool
+    record_sessions_dir: str
+    backoffice_token: str
+
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """
+    Reads the .env file and environment once per process; later calls return the same object.
+    """
+    load_dotenv()
+    return Settings(
+        application_db_path=os.getenv("APPLICATION_DB_PATH"),
+        sessions_db_path=os.getenv("SESSIONS_DB_PATH"),
+        schemes_db_path=os.getenv("SCHEMES_DB_PATH"),
+        users_db_path=os.getenv("USERS_DB_PATH"),
+        catalog_snapshot_dir=os.getenv("CATALOG_SNAPSHOT_DIR"),
+        # workers that only serve the batch/status endpoints can skip loading the agent stack
+        warm_up_agent=os.getenv("AGENT_WARM_UP", "1").lower() not in ("0", "false", "no"),
+        # when set, /agent/run sessions are recorded there as replay fixtures
+        record_sessions_dir=os.getenv("RECORD_SESSIONS_DIR"),
+        # shared secret department back-offices send to change an application's status
+        backoffice_token=os.getenv("BACKOFFICE_TOKEN"),
+    )
@@ -0,0 +1,202 @@
+import sqlite3
+import json
+import re
+import asyncio
+
+from settings import get_settings
+
+# how often an idle subscriber re-reads the event log for updates published by other workers
+RECHECK_SECONDS = 5
+# set once the status event log exists
+_status_schema_ready = False
+
+
+def ensure_status_schema(conn):
+    """Create the status event log next to the applications table if it is missing (once per process)."""
+    global _status_schema_ready
+    if _status_schema_ready:
+        return
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS application_status_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            application_uuid TEXT NOT NULL,
+            status TEXT NOT NULL,
+            officer_level TEXT,
+            procedure_step TEXT,
+            remarks TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_status_events_uuid
+        ON application_status_events (application_uuid, id)
+    """)
+    _status_schema_ready = True
+
+
+def _event_from_row(row) -> dict:
+    return {
+        "event_id": row[0],
+        "application_uuid": row[1],
+        "status": row[2],
+        "officer_level": row[3],
+        "procedure_step": row[4],
+        "remarks": row[5],
+        "created_at": row[6],
+    }
+
+
+def officer_step(scheme_name: str, officer_level: str, scheme_id: int = None) -> str:
+    """
+    Find the procedure step of a scheme handled by an officer level (e.g. "L1", "L2").
+
+    Scheme names are not unique, so the scheme is looked up by `scheme_id` when it is
+    known; the name is only used for applications stored before scheme ids were recorded.
+
+    Returns:
+        str: The text of the matching step from `procedure_steps`, or None if the scheme
+             has no step for that level (or the scheme is unknown).
+    """
+    conn = sqlite3.connect(get_settings().schemes_db_path)
+    if scheme_id is not None:
+        row = conn.execute("SELECT procedure_steps FROM schemes WHERE id = ?", (scheme_id,)).fetchone()
+    else:
+        row = conn.execute("SELECT procedure_steps FROM schemes WHERE name = ?", (scheme_name,)).fetchone()
+    conn.close()
+    if row is None:
+        return None
+
+    pattern = re.compile(rf"\b{re.escape(officer_level)}\b")
+    for step in json.loads(row[0] or '[]'):
+        if pattern.search(step):
+            return step
+    return None
+
+
+def record_status_change(application_uuid: str, status: str, officer_level: str = None, remarks: str = None) -> dict:
+    """
+    Update an application's status on behalf of a department officer and log the change.
+
+    The `applications.status` column and the event log are written in one transaction.
+    When an officer level is given it must match one of the L1/L2/... officer steps
+    in the scheme's `procedure_steps`; that step is stored with the event.
+
+    Returns:
+        dict: The stored event, or {"error": str} if the update was rejected.
+    """
+    conn = sqlite3.connect(get_settings().application_db_path)
+    ensure_status_schema(conn)
+
+    has_scheme_id = "scheme_id" in [r[1] for r in conn.execute("PRAGMA table_info(applications)")]
+    row = conn.execute(
+        f"SELECT scheme_name, {'scheme_id' if has_scheme_id else 'NULL'} FROM applications WHERE application_uuid = ?",
+        (application_uuid,)
+    ).fetchone()
+    if row is None:
+        conn.close()
+        return {"error": "Application not found"}
+
+    step = None
+    if officer_level:
+        officer_level = officer_level.upper()
+        step = officer_step(row[0], officer_level, row[1])
+        if step is None:
+            conn.close()
+            return {"error": f"Scheme '{row[0]}' has no {officer_level} officer step in its procedure"}
+
+    with conn:
+        conn.execute(
+            "UPDATE applications SET status = ? WHERE application_uuid = ?", (status, application_uuid)
+        )
+        cursor = conn.execute("""
+            INSERT INTO application_status_events (application_uuid, status, officer_level, procedure_step, remarks)
+            VALUES (?, ?, ?, ?, ?)
+            """, (application_uuid, status, officer_level, step, remarks)
+        )
+        event = conn.execute("""
+            SELECT id, application_uuid, status, officer_level, procedure_step, remarks, created_at
+            FROM application_status_events
+            WHERE id = ?
+            """, (cursor.lastrowid,)
+        ).fetchone()
+    conn.close()
+
+    return _event_from_row(event)
+
+
+def status_events_since(application_uuid: str, after_event_id: int = None) -> dict:
+    """
+    Catch-up read for a subscriber.
+
+    With `after_event_id` it returns the logged events newer than that id. Without it,
+    it returns only the current status (the latest event, or the `applications` row as
+    event 0 for applications that have no logged change yet).
+
+    Returns:
+        dict: {"events": [...]} or {"error": "Application not found"}
+    """
+    conn = sqlite3.connect(get_settings().application_db_path)
+    ensure_status_schema(conn)
+
+    current = conn.execute("""
+        SELECT application_uuid, status, created_at FROM applications WHERE application_uuid = ?
+        """, (application_uuid,)
+    ).fetchone()
+    if current is None:
+        conn.close()
+        return {"error": "Application not found"}
+
+    columns = "id, application_uuid, status, officer_level, procedure_step, remarks, created_at"
+    if after_event_id is None:
+        rows = conn.execute(f"""
+            SELECT {columns} FROM application_status_events
+            WHERE application_uuid = ? ORDER BY id DESC LIMIT 1
+            """, (application_uuid,)
+        ).fetchall()
+        if not rows:
+            rows = [(0, current[0], current[1], None, None, None, current[2])]
+    else:
+        rows = conn.execute(f"""
+            SELECT {columns} FROM application_status_events
+            WHERE application_uuid = ? AND id > ? ORDER BY id
+            """, (application_uuid, after_event_id)
+        ).fetchall()
+    conn.close()
+
+    return {"events": [_event_from_row(row) for row in rows]}
+
+
+class StatusHub:
+    """
+    In-process fan-out of status events to subscribers of an application.
+
+    Subscribers wait on their own queue, so an idle long-poll or WebSocket costs
+    nothing until a status update for that application is published.
+
+    Only updates made through this process are published here. With several workers,
+    an update handled by another worker only shows up when the subscriber re-reads the
+    event log with `status_events_since`, which the status endpoints do every
+    RECHECK_SECONDS while idle; such updates arrive up to that much later.
+    """
+
+    def __init__(self):
+        self._subscribers = {}
+
+    def subscribe(self, application_uuid: str) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        self._subscribers.setdefault(application_uuid, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, application_uuid: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(application_uuid)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[application_uuid]
+
+    def publish(self, event: dict):
+        for queue in self._subscribers.get(event["application_uuid"], ()):
+            queue.put_nowait(event)
+
+
+status_hub = StatusHub()
@@ -0,0 +1,119 @@
+"""
+Stress check for per-session turn serialization.
+
+Fires many concurrent /agent/run-style turns at SessionTurns with a stubbed agent
+turn (no LLM, no DB) and verifies that:
+  1. duplicate requests (same session, same idempotency key) share a single run,
+  2. distinct requests on one session never overlap and each bumps the version once,
+  3. different sessions still run in parallel,
+  4. a stale expected_version is rejected, also by a fresh SessionTurns (a restarted
+     or other worker) that reads the same stored versions.
+
+Usage: python stress_session_turns.py [--requests 200] [--turn-ms 50]
+"""
+import asyncio
+import argparse
+import time
+
+from session_turns import SessionTurns, StaleSessionError
+
+
+class FakeAgent:
+    def __init__(self, turn_seconds):
+        self.turn_seconds = turn_seconds
+        self.active = {}
+        self.max_active = {}
+        self.calls = 0
+        # stands in for the session store: turns stored per session
+        self.stored = {}
+        self.version_loads = 0
+
+    async def stored_version(self, session_id):
+        self.version_loads += 1
+        return self.stored.get(session_id, 0)
+
+    def turn(self, session_id, query):
+        async def run():
+            self.calls += 1
+            self.active[session_id] = self.active.get(session_id, 0) + 1
+            self.max_active[session_id] = max(self.max_active.get(session_id, 0), self.active[session_id])
+            await asyncio.sleep(self.turn_seconds)
+            self.stored[session_id] = self.stored.get(session_id, 0) + 1
+            self.active[session_id] -= 1
+            return {"response": f"echo: {query}", "session_id": session_id}, self.stored[session_id]
+        return run
+
+
+async def duplicate_requests(n, turn_seconds):
+    agent = FakeAgent(turn_seconds)
+    turns = SessionTurns(load_version=agent.stored_version)
+    results = await asyncio.gather(*[
+        turns.run("s1", "retry-key", agent.turn("s1", "hello")) for _ in range(n)
+    ])
+    assert agent.calls == 1, f"expected 1 agent run, got {agent.calls}"
+    assert all(result == results[0] for result in results)
+    print(f"[ok] {n} duplicate requests -> {agent.calls} agent run, {turns.attached} attached")
+
+
+async def distinct_requests(n, turn_seconds):
+    agent = FakeAgent(turn_seconds)
+    turns = SessionTurns(load_version=agent.stored_version)
+    results = await asyncio.gather(*[
+        turns.run("s1", f"key-{i}", agent.turn("s1", f"q{i}")) for i in range(n)
+    ])
+    versions = sorted(version for _, version in results)
+    assert agent.max_active["s1"] == 1, "turns of one session overlapped"
+    assert versions == list(range(1, n + 1)), "each turn must produce exactly one new version"
+    assert agent.version_loads == 0, "the version is only read from storage for expected_version"
+    print(f"[ok] {n} distinct requests on one session ran one at a time, final version {versions[-1]}")
+
+
+async def parallel_sessions(n, turn_seconds):
+    agent = FakeAgent(turn_seconds)
+    turns = SessionTurns(load_version=agent.stored_version)
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        turns.run(f"s{i}", None, agent.turn(f"s{i}", "hello")) for i in range(n)
+    ])
+    elapsed = time.perf_counter() - start
+    serial = turn_seconds * n
+    assert elapsed < serial / 2, f"{n} sessions took {elapsed:.2f}s (serial would be {serial:.2f}s), not parallel"
+    assert not turns._locks, "per-session locks leaked"
+    print(f"[ok] {n} sessions in parallel took {elapsed * 1000:.0f} ms (one turn is {turn_seconds * 1000:.0f} ms)")
+
+
+async def stale_version(turn_seconds):
+    agent = FakeAgent(turn_seconds)
+    turns = SessionTurns(load_version=agent.stored_version)
+    await turns.run("s1", None, agent.turn("s1", "first"), expected_version=0)
+    try:
+        await turns.run("s1", None, agent.turn("s1", "second"), expected_version=0)
+    except StaleSessionError:
+        print("[ok] stale expected_version rejected")
+    else:
+        raise AssertionError("stale expected_version was accepted")
+
+    restarted = SessionTurns(load_version=agent.stored_version)
+    _, version = await restarted.run("s1", None, agent.turn("s1", "second"), expected_version=1)
+    assert version == 2, f"expected version 2 after restart, got {version}"
+    try:
+        await restarted.run("s1", None, agent.turn("s1", "third"), expected_version=0)
+    except StaleSessionError:
+        print("[ok] version survives a restart")
+    else:
+        raise AssertionError("restarted worker accepted a stale expected_version")
+
+
+async def main(n, turn_seconds):
+    await duplicate_requests(n, turn_seconds)
+    await distinct_requests(min(n, 20), turn_seconds / 10)
+    await parallel_sessions(n, turn_seconds)
+    await stale_version(turn_seconds)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--turn-ms", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.turn_ms / 1000))
@@ -1,8 +1,23 @@
 import sqlite3
 import json
 import os
+import math
+import struct
 
 DB_FILE = "karnataka_schemes.db"
+SNAPSHOT_DIR = os.getenv("CATALOG_SNAPSHOT_DIR", "catalog_snapshots")
+
+# --- Catalog snapshot layout (read by api/catalog.py, keep both in sync) ---
+# header | fixed-width scheme records | UTF-8 string/JSON blob region
+SNAPSHOT_MAGIC = b"KSCATLG1"
+SNAPSHOT_HEADER = struct.Struct("<8sIIIQQ")  # magic, catalog version, count, record size, blob offset, blob size
+SNAPSHOT_STRING_FIELDS = (
+    "name", "department_name", "definition", "eligibility_summary", "gender_eligibility", "benefit_type",
+    "community_eligibility", "districts", "procedure_steps", "supporting_documents", "required_information",
+)
+# id, department_id, min_age, max_age, max_annual_income, max_benefit_amount, interest_rate, application_fee,
+# then an (offset, length) pair into the blob region for each string field; NULL numbers are stored as NaN / -1
+SNAPSHOT_RECORD = struct.Struct("<iiiidddd" + "II" * len(SNAPSHOT_STRING_FIELDS))
 
 # --- Data Parsed and Cleaned from the Text File ---
 # This data is embedded directly in the script for simplicity and reliability.
@@ -185,5 +200,88 @@ def create_database():
         if conn:
             conn.close()
 
+def create_catalog_snapshot(db_file=DB_FILE, out_dir=SNAPSHOT_DIR):
+    """
+    Emits a read-only, versioned snapshot of the scheme catalog for the API workers.
+
+    Numeric columns go into fixed-width records and every text/JSON column into one blob
+    region addressed by offsets, so workers can mmap the file and decode fields lazily.
+    Each run writes catalog.v<N>.bin with the next version and then atomically repoints
+    the CURRENT file, which running workers pick up without a restart.
+    """
+    conn = sqlite3.connect(db_file)
+    conn.row_factory = sqlite3.Row
+    # same joins as find_eligible_schemes, so the snapshot lists exactly what the SQL search can return
+    schemes = [dict(row) for row in conn.execute("""
+        SELECT s.*, d.name AS department_name
+        FROM schemes s
+        JOIN departments d ON s.department_id = d.id
+        WHERE EXISTS (SELECT 1 FROM scheme_geographies sg WHERE sg.scheme_id = s.id)
+        ORDER BY s.id
+    """)]
+    districts = {}
+    for scheme_id, district in conn.execute("SELECT scheme_id, district FROM scheme_geographies ORDER BY id"):
+        districts.setdefault(scheme_id, []).append(district)
+    conn.close()
+
+    os.makedirs(out_dir, exist_ok=True)
+    current_file = os.path.join(out_dir, "CURRENT")
+    version = 1
+    if os.path.exists(current_file):
+        with open(current_file) as f:
+            version = int(f.read().strip()[len("catalog.v"):-len(".bin")]) + 1
+
+    def number(value):
+        return math.nan if value is None else value
+
+    blob = bytearray()
+    records = bytearray()
+    for scheme in schemes:
+        scheme["districts"] = json.dumps(districts.get(scheme["id"], []))
+        refs = []
+        for field in SNAPSHOT_STRING_FIELDS:
+            data = (scheme[field] or "").encode("utf-8")
+            refs.extend((len(blob), len(data)))
+            blob += data
+        records += SNAPSHOT_RECORD.pack(
+            scheme["id"], scheme["department_id"] or -1,
+            -1 if scheme["min_age"] is None else scheme["min_age"],
+            -1 if scheme["max_age"] is None else scheme["max_age"],
+            number(scheme["max_annual_income"]), number(scheme["max_benefit_amount"]),
+            number(scheme["interest_rate"]), number(scheme["application_fee"]),
+            *refs
+        )
+
+    blob_offset = SNAPSHOT_HEADER.size + len(records)
+    file_name = f"catalog.v{version}.bin"
+    path = os.path.join(out_dir, file_name)
+    with open(path + ".tmp", "wb") as f:
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, version, len(schemes), SNAPSHOT_RECORD.size, blob_offset, len(blob)))
+        f.write(records)
+        f.write(blob)
+    os.replace(path + ".tmp", path)
+
+    with open(current_file + ".tmp", "w") as f:
+        f.write(file_name)
+    os.replace(current_file + ".tmp", current_file)
+
+    # keep the previous two versions around for workers that have not swapped yet
+    for old in os.listdir(out_dir):
+        if old.startswith("catalog.v") and old.endswith(".bin") and int(old[len("catalog.v"):-len(".bin")]) < version - 2:
+            os.remove(os.path.join(out_dir, old))
+
+    print(f"Wrote catalog snapshot {path} ({len(schemes)} schemes, version {version})")
+
 if __name__ == "__main__":
-    create_database()
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--snapshot-only", metavar="DB", nargs="?", const=DB_FILE,
+                        help="only emit a catalog snapshot from an existing database")
+    args = parser.parse_args()
+
+    if args.snapshot_only:
+        create_catalog_snapshot(args.snapshot_only)
+    else:
+        create_database()
+        create_catalog_snapshot()
\ No newline at end of file
@@ -1,6 +1,6 @@
 from google.adk.agents import LlmAgent
 from google.adk.models.lite_llm import LiteLlm
-from .tools import save_application, check_application_status, find_eligible_schemes, fetch_user_profile
+from .tools import submit_application, check_application_status, find_eligible_schemes, fetch_user_profile
 
 root_agent = LlmAgent(
     name="GovSchemeAgent",
@@ -63,11 +63,11 @@ root_agent = LlmAgent(
         • Explicitly ask for their confirmation to proceed, for example: "I have the following details for your application: <details>. Shall I proceed with submitting your application?"
         • Handle User's Confirmation:
             - **If the user confirms ('yes', 'proceed', 'submit it'):**
-                - Generate a UUID (application ID).
-                - Use the `save_application` tool to store the application in the database, Pass the collected Aadhaar number, applicant name, phone number, and chosen scheme.
-                - Confirm to the user that the application has been submitted successfully, providing the application ID.
+                - Call the `submit_application` tool once with the scheme name and its `id` as `scheme_id`, the Aadhaar number, applicant name and phone number, every collected item of `required_information` as a JSON object in `collected_information_json` (keyed by the exact item name), and the names of the provided documents as a JSON list in `documents_json`.
+                - The application ID is generated by the tool. If the tool returns `problems`, ask the user for all of the corrected or missing details together, then call the tool again.
+                - Confirm to the user that the application has been submitted successfully, providing the application ID returned by the tool.
             - **If the user denies or is unsure ('no', 'wait', 'cancel'):**
-                - Acknowledge their decision. DO NOT Generate a UUID (application ID) or call the `save_application` tool.
+                - Acknowledge their decision. DO NOT call the `submit_application` tool.
                 - Politely ask if they would like to explore other schemes or apply for a different one. This gracefully transitions the conversation back to the discovery phase.
 
     - When the user asks about the status of their application:
@@ -90,5 +90,5 @@ root_agent = LlmAgent(
     - Always provide the final Application ID to the user once submission is complete.
     - Make sure the whole process is Authentic as the real application process.
     """,
-    tools=[fetch_user_profile, find_eligible_schemes ,save_application, check_application_status]
+    tools=[fetch_user_profile, find_eligible_schemes ,submit_application, check_application_status]
 )
\ No newline at end of file
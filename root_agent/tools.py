@@ -1,39 +1,237 @@
-def save_application(app_uuid: str, scheme_name: str, aadhar_number: str, applicant_name: str, phone: str) -> dict:
+import sqlite3
+import json
+import asyncio
+import os
+import re
+import uuid
+from datetime import datetime, date
+
+from .settings import get_settings
+from .coalesce import single_flight
+from .catalog import current_catalog
+
+# normalized scheme name -> ids, rebuilt when the catalog snapshot or schemes DB changes
+_scheme_index = {"key": None, "by_name": {}, "names": {}}
+# set once the applications DB has the scheme_id column and the field/document tables
+_application_schema_ready = False
+
+def _normalize_scheme_name(name: str) -> str:
+    return " ".join(name.replace("\u2013", "-").replace("\u2014", "-").casefold().split())
+
+def _load_scheme_index():
+    catalog = current_catalog()
+    if catalog is not None:
+        key = ("catalog", catalog.file_name)
+    else:
+        DB_PATH = get_settings().schemes_db_path
+        key = ("sqlite", DB_PATH, os.path.getmtime(DB_PATH))
+    if _scheme_index["key"] == key:
+        return _scheme_index
+
+    if catalog is not None:
+        schemes = [(scheme["id"], scheme["name"]) for scheme in catalog]
+    else:
+        conn = sqlite3.connect(DB_PATH)
+        schemes = conn.execute("SELECT id, name FROM schemes").fetchall()
+        conn.close()
+
+    by_name = {}
+    for scheme_id, name in schemes:
+        by_name.setdefault(_normalize_scheme_name(name), []).append(scheme_id)
+    _scheme_index.update(key=key, by_name=by_name, names=dict(schemes))
+    return _scheme_index
+
+def resolve_scheme(scheme_name: str = "", scheme_id: int = 0):
+    """
+    Resolve a scheme to its id, preferring an explicit id over the name.
+    The name matches exactly (ignoring case, spacing and dash style) or as a unique partial name.
+
+    Returns:
+        (scheme_id, scheme_name, error): error is None when the scheme was resolved.
     """
-    Save a new scheme application into the database.
+    try:
+        # bool is an int subclass, but True is not scheme 1
+        if isinstance(scheme_id, bool):
+            raise TypeError
+        scheme_id = int(scheme_id or 0)
+    except (TypeError, ValueError):
+        return None, None, f"Scheme id must be a number, not {scheme_id!r}."
+
+    index = _load_scheme_index()
+    if scheme_id:
+        if scheme_id in index["names"]:
+            return scheme_id, index["names"][scheme_id], None
+        return None, None, f"No scheme found with id {scheme_id}."
+
+    needle = _normalize_scheme_name(scheme_name or "")
+    if not needle:
+        return None, None, "A scheme name or scheme id is required."
+    ids = index["by_name"].get(needle)
+    if ids is None:
+        ids = [i for name, name_ids in index["by_name"].items() if needle in name for i in name_ids]
+    if len(ids) == 1:
+        return ids[0], index["names"][ids[0]], None
+    if not ids:
+        return None, None, f"No scheme found matching '{scheme_name}'."
+    candidates = ", ".join(f"{index['names'][i]} (id {i})" for i in sorted(ids))
+    return None, None, f"'{scheme_name}' matches several schemes, pass the scheme_id of one of: {candidates}."
+
+def _required_information(scheme_id: int) -> list:
+    catalog = current_catalog()
+    if catalog is not None:
+        for scheme in catalog:
+            if scheme["id"] == scheme_id:
+                return scheme["required_information"]
+        return []
+
+    conn = sqlite3.connect(get_settings().schemes_db_path)
+    row = conn.execute("SELECT required_information FROM schemes WHERE id = ?", (scheme_id,)).fetchone()
+    conn.close()
+    return json.loads(row[0] or '[]') if row else []
+
+def _is_blank(value) -> bool:
+    # null, empty and whitespace-only values do not count as provided information
+    if isinstance(value, str):
+        value = value.strip()
+    return value is None or value in ("", [], {})
+
+def _field_value(value):
+    # strings are stored as given, anything else (numbers, lists, objects) as JSON
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False)
+
+def _ensure_application_schema(conn):
+    # runs once per process; BEGIN IMMEDIATE makes first submissions that race (in any
+    # process) take turns, so the column is only added by one of them
+    global _application_schema_ready
+    if _application_schema_ready:
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        columns = [r[1] for r in conn.execute("PRAGMA table_info(applications)")]
+        if "scheme_id" not in columns:
+            conn.execute("ALTER TABLE applications ADD COLUMN scheme_id INTEGER")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS application_fields (
+                application_uuid TEXT NOT NULL,
+                field_name TEXT NOT NULL,
+                value TEXT,
+                PRIMARY KEY (application_uuid, field_name)
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS application_documents (
+                application_uuid TEXT NOT NULL,
+                document_name TEXT NOT NULL,
+                PRIMARY KEY (application_uuid, document_name)
+            )
+        """)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    _application_schema_ready = True
+
+async def submit_application(scheme_name: str, aadhar_number: str, applicant_name: str, phone: str,
+                             collected_information_json: str = "{}", documents_json: str = "[]",
+                             scheme_id: int = 0) -> dict:
+    """
+    Validate and submit a scheme application. The application ID is generated here.
+
+    Every problem (unknown scheme, bad Aadhaar or phone number, missing required information)
+    is reported together, so they can all be fixed before submitting again.
 
     Args:
-        app_uuid (str): Application ID (uuid)
         scheme_name (str): Name of the scheme applied for
-        aadhar_number (str): User's Aadhaar number
+        aadhar_number (str): Applicant's 12-digit Aadhaar number
         applicant_name (str): Name of the applicant
-        phone (str): Phone number of the applicant
+        phone (str): Applicant's 10-digit mobile number
+        collected_information_json (str): JSON object with one entry per item of the scheme's
+            `required_information` list, keyed by that item's exact name
+        documents_json (str): JSON list with the names of the documents the user provided
+        scheme_id (int): Scheme id from `find_eligible_schemes`; needed when several schemes share a name
 
     Returns:
-        dict: {"application_uuid": str, "status": str}
+        dict: {"application_uuid": str, "scheme_id": int, "scheme_name": str, "status": "Submitted"} on success,
+              {"error": str, "problems": [str]} otherwise
     """
-    import sqlite3, os
-
-    from dotenv import load_dotenv
-    load_dotenv()
+    # the lookups, the schema migration and the write transaction can wait on SQLite locks,
+    # so they run in a thread rather than on the event loop every session shares
+    return await asyncio.to_thread(
+        _submit_application, scheme_name, aadhar_number, applicant_name, phone,
+        collected_information_json, documents_json, scheme_id
+    )
 
-    DB_PATH = os.getenv("APPLICATION_DB_PATH")
+def _submit_application(scheme_name: str, aadhar_number: str, applicant_name: str, phone: str,
+                        collected_information_json: str, documents_json: str, scheme_id: int) -> dict:
+    problems = []
+
+    resolved_id, resolved_name, error = resolve_scheme(scheme_name, scheme_id)
+    if error:
+        problems.append(error)
+
+    aadhar_number = re.sub(r"[\s-]", "", aadhar_number or "")
+    if not re.fullmatch(r"[2-9]\d{11}", aadhar_number):
+        problems.append("Aadhaar number must be 12 digits and cannot start with 0 or 1.")
+
+    phone = re.sub(r"[\s-]", "", phone or "")
+    phone = re.sub(r"^(\+91|91(?=\d{10}$)|0(?=\d{10}$))", "", phone)
+    if not re.fullmatch(r"[6-9]\d{9}", phone):
+        problems.append("Phone number must be a 10-digit mobile number starting with 6, 7, 8 or 9.")
+
+    if not (applicant_name or "").strip():
+        problems.append("Applicant name is required.")
+
+    try:
+        collected = json.loads(collected_information_json or "{}")
+        if not isinstance(collected, dict):
+            raise ValueError
+    except ValueError:
+        collected = {}
+        problems.append("collected_information_json must be a JSON object of field name to value.")
+    try:
+        documents = json.loads(documents_json or "[]")
+        if not isinstance(documents, list):
+            raise ValueError
+    except ValueError:
+        documents = []
+        problems.append("documents_json must be a JSON list of document names.")
+
+    if resolved_id is not None:
+        provided = {str(k).strip().casefold() for k, v in collected.items() if not _is_blank(v)}
+        missing = [field for field in _required_information(resolved_id) if field.strip().casefold() not in provided]
+        if missing:
+            problems.append("Missing required information: " + ", ".join(missing) + ".")
+
+    if problems:
+        return {"error": "Application was not submitted.", "problems": problems}
+
+    app_uuid = str(uuid.uuid4())
+    DB_PATH = get_settings().application_db_path
 
     conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        INSERT INTO applications (application_uuid, scheme_name, aadhar_number, applicant_name, phone)
-        VALUES (?, ?, ?, ?, ?)
-        """, (app_uuid, scheme_name, aadhar_number, applicant_name, phone)
-    )
-
-    conn.commit()
+    _ensure_application_schema(conn)
+    with conn:
+        conn.execute("""
+            INSERT INTO applications (application_uuid, scheme_id, scheme_name, aadhar_number, applicant_name, phone)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """, (app_uuid, resolved_id, resolved_name, aadhar_number, applicant_name.strip(), phone)
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO application_fields (application_uuid, field_name, value) VALUES (?, ?, ?)",
+            [(app_uuid, str(k).strip(), _field_value(v)) for k, v in collected.items()]
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO application_documents (application_uuid, document_name) VALUES (?, ?)",
+            [(app_uuid, str(d).strip()) for d in documents if str(d).strip()]
+        )
     conn.close()
 
-    return {"application_uuid": app_uuid, "status": "Submitted"}
+    return {"application_uuid": app_uuid, "scheme_id": resolved_id, "scheme_name": resolved_name, "status": "Submitted"}
 
-def check_application_status(application_uuid: str) -> dict:
+@single_flight()
+async def check_application_status(application_uuid: str) -> dict:
     """
     Fetch the status of a scheme application by its UUID.
 
@@ -44,12 +242,11 @@ def check_application_status(application_uuid: str) -> dict:
         dict: { "application_uuid": str, "status": str } if found,
               { "error": "Application not found" } otherwise
     """
-    import sqlite3, os
+    # the query runs in a thread so concurrent sessions overlap here and can be coalesced
+    return await asyncio.to_thread(_read_application_status, application_uuid)
 
-    from dotenv import load_dotenv
-    load_dotenv()
-
-    DB_PATH = os.getenv("APPLICATION_DB_PATH")
+def _read_application_status(application_uuid: str) -> dict:
+    DB_PATH = get_settings().application_db_path
 
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
@@ -68,12 +265,88 @@ def check_application_status(application_uuid: str) -> dict:
         return {"error": "Application not found"}
     
 def calculate_age(dob_str):
-    from datetime import datetime, date
     born = datetime.strptime(dob_str, "%Y-%m-%d").date()
     today = date.today()
     return today.year - born.year - ((today.month, today.day) < (born.month, born.day))
 
-def fetch_user_profile(aadhaar_number: str) -> str:
+def is_eligible(profile: dict, scheme) -> bool:
+    """
+    In-process equivalent of the personalized search in `find_eligible_schemes`.
+    Only the keys present in the profile are checked; `scheme` is anything indexable
+    by the schemes table columns (plus a "districts" list).
+    """
+    if "age" in profile:
+        if profile["age"] is None:
+            return False
+        if scheme["min_age"] is not None and profile["age"] < scheme["min_age"]:
+            return False
+        if scheme["max_age"] is not None and profile["age"] > scheme["max_age"]:
+            return False
+    if "gender" in profile and scheme["gender_eligibility"] not in (profile["gender"], "Any"):
+        return False
+    if "annual_income" in profile and scheme["max_annual_income"] is not None:
+        if profile["annual_income"] is None or profile["annual_income"] > scheme["max_annual_income"]:
+            return False
+    if "district" in profile and not any(d in (profile["district"], "All Districts") for d in scheme["districts"]):
+        return False
+    if "community" in profile and not any(c in (profile["community"], "General") for c in scheme["community_eligibility"]):
+        return False
+    return True
+
+def _like_pattern(scheme_name: str):
+    # `name LIKE '%<scheme_name>%'`: % and _ are wildcards, case is folded for ASCII letters only
+    pattern = "".join(".*" if c == "%" else "." if c == "_" else re.escape(c) for c in scheme_name)
+    return re.compile(pattern, re.IGNORECASE | re.ASCII | re.DOTALL)
+
+def _numeric_profile(profile: dict) -> dict:
+    # models often quote numbers ("30"); SQLite's column affinity compares those as numbers,
+    # anything else as text, which no age or income bound accepts
+    profile = dict(profile)
+    for key in ("age", "annual_income"):
+        value = profile.get(key)
+        if isinstance(value, str):
+            if not re.fullmatch(r"\s*[+-]?\d+(\.\d+)?\s*", value):
+                raise ValueError(f"{key} is not a number: {value!r}")
+            profile[key] = float(value)
+    return profile
+
+def _find_in_catalog(catalog, user_profile_json: str, scheme_name: str) -> list:
+    # same three searches as the SQL path, answered from the mapped catalog snapshot
+    if scheme_name:
+        pattern = _like_pattern(scheme_name)
+        matches = [scheme for scheme in catalog if pattern.search(scheme["name"])]
+    else:
+        try:
+            profile = json.loads(user_profile_json)
+        except json.JSONDecodeError:
+            profile = {}
+        if not isinstance(profile, dict):
+            profile = {}
+        try:
+            profile = _numeric_profile(profile)
+            matches = [scheme for scheme in catalog if is_eligible(profile, scheme)]
+        except (ValueError, TypeError):
+            matches = []
+
+    fields = ('id', 'name', 'department_name', 'definition', 'eligibility_summary', 'application_fee',
+              'required_information', 'supporting_documents')
+    return [{field: scheme[field] for field in fields} for scheme in matches]
+
+def _eligibility_search_key(user_profile_json: str = "{}", scheme_name: str = "") -> tuple:
+    # requests that find_eligible_schemes would turn into the same SQL query share one key
+    if scheme_name:
+        return ("scheme_name", scheme_name)
+    try:
+        profile = json.loads(user_profile_json)
+    except (json.JSONDecodeError, TypeError):
+        return ("profile", None)
+    if not isinstance(profile, dict):
+        return ("profile", user_profile_json)
+    used = ('age', 'gender', 'annual_income', 'district', 'community')
+    return ("profile", json.dumps({k: profile[k] for k in used if k in profile}, sort_keys=True))
+
+@single_flight()
+async def fetch_user_profile(aadhaar_number: str) -> str:
     """
     Simulates fetching user data from DigiLocker using their Aadhaar number.
     It retrieves the user's profile from a local database.
@@ -84,13 +357,10 @@ def fetch_user_profile(aadhaar_number: str) -> str:
     Returns:
         A JSON string containing the user's profile if found, otherwise an error message.
     """
-    import sqlite3
-    import json, os
-
-    from dotenv import load_dotenv
-    load_dotenv()
+    return await asyncio.to_thread(_read_user_profile, aadhaar_number)
 
-    DB_PATH = os.getenv("USERS_DB_PATH")
+def _read_user_profile(aadhaar_number: str) -> str:
+    DB_PATH = get_settings().users_db_path
 
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
@@ -101,12 +371,16 @@ def fetch_user_profile(aadhaar_number: str) -> str:
     if user:
         user_dict = dict(user)
         user_dict['age'] = calculate_age(user_dict['dob'])
+        # user_details only carries `city` today; it holds the district name
+        if 'district' not in user_dict:
+            user_dict['district'] = user_dict.get('city')
         return json.dumps(user_dict)
     else:
         return json.dumps({"error": "No user profile found for the provided Aadhaar number."})
     
 
-def find_eligible_schemes(user_profile_json: str = "{}", scheme_name: str = "") -> str:
+@single_flight(normalize=_eligibility_search_key)
+async def find_eligible_schemes(user_profile_json: str = "{}", scheme_name: str = "") -> str:
     """
     Finds government schemes from the database. It can perform three types of searches:
     1. Personalized Search: Finds schemes a user is eligible for based on their profile.
@@ -123,13 +397,17 @@ def find_eligible_schemes(user_profile_json: str = "{}", scheme_name: str = "")
     Returns:
         A JSON string containing a list of matching schemes, including lists for required information and documents.
     """
-    import sqlite3
-    import json
-    import os
-    from dotenv import load_dotenv
+    return await asyncio.to_thread(_search_schemes, user_profile_json, scheme_name)
+
+def _search_schemes(user_profile_json: str = "{}", scheme_name: str = "") -> str:
+    catalog = current_catalog()
+    if catalog is not None:
+        schemes = _find_in_catalog(catalog, user_profile_json, scheme_name)
+        if not schemes:
+            return json.dumps({"message": "No schemes found matching your criteria."})
+        return json.dumps(schemes)
 
-    load_dotenv()
-    DB_PATH = os.getenv("SCHEMES_DB_PATH")
+    DB_PATH = get_settings().schemes_db_path
 
     if not os.path.exists(DB_PATH):
         return json.dumps({"error": f"Database file not found at path: {DB_PATH}"})